@@ -88,8 +88,8 @@ class LauterbachFuzz(DbgFuzz):
 
     def setMemoryByAddress(self, addressInt: int, data: bytes) -> None:
         address = self.__dbg.address(access="D", value=addressInt)
-        int_tuple = tuple(int(byte) for byte in data)
-        self.__dbg.memory.write_uint8_array(address=address, data=int_tuple)
+        # iterating bytes already yields ints, no per-byte conversion needed
+        self.__dbg.memory.write_uint8_array(address=address, data=tuple(data))
 
     def startFuzz(self) -> None:
         while True:
@@ -104,7 +104,7 @@ class LauterbachFuzz(DbgFuzz):
     def __getSymbolByVariableName(self, variableName: str) -> Symbol:
         symbol = self.__symbolCache.get(variableName)
 
-        if symbol == None:
+        if symbol is None:
             symbol = self.__dbg.symbol.query_by_name(variableName)
             self.__symbolCache[variableName] = symbol
         return symbol
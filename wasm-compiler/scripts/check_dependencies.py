@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+import re
 
 output_file_path = "check.ll"
 
@@ -80,6 +81,14 @@ new_delete_std_symbols = [
     ],
 ]
 
+# match all symbols in one pass per line instead of one substring search per symbol
+new_delete_std_symbol_map = {
+    "@" + symbol[0] + "(": symbol for symbol in new_delete_std_symbols
+}
+new_delete_std_symbol_pattern = re.compile(
+    "|".join(re.escape(declaration) for declaration in new_delete_std_symbol_map)
+)
+
 diagnose = []
 
 
@@ -95,7 +104,7 @@ def diagnose_error_file(error_symbol, file_name):
     )
     current_def = "unknown"
     with open(output_file_path) as f:
-        for line in f.readlines():
+        for line in f:
             if line.startswith("define "):
                 current_def = line[:-1]
             elif line.startswith("declare "):
@@ -108,11 +117,12 @@ def diagnose_error_file(error_symbol, file_name):
 def runCheck(file_name):
     os.system("clang {} -S -emit-llvm -I. -o {}".format(file_name, output_file_path))
     with open(output_file_path) as f:
-        for line in f.readlines():
+        for line in f:
             if line.startswith("declare "):
-                for symbol in new_delete_std_symbols:
-                    if ("@" + symbol[0] + "(") in line:
-                        diagnose_error_file(symbol, file_name)
+                for match in new_delete_std_symbol_pattern.finditer(line):
+                    diagnose_error_file(
+                        new_delete_std_symbol_map[match.group(0)], file_name
+                    )
 
 
 def main():
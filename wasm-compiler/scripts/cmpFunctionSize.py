@@ -29,6 +29,8 @@ import re
 import os
 import argparse
 
+FUNCTION_SIZE_PATTERN = re.compile(r"Size of the function body:\s+(\d+)")
+
 
 def extract_function_sizes(filename):
     """Extract lines containing function sizes and their line numbers from a file."""
@@ -37,7 +39,9 @@ def extract_function_sizes(filename):
 
     with open(filename, "r") as f:
         for i, line in enumerate(f, 1):
-            match = re.search(r"Size of the function body:\s+(\d+)", line)
+            if "Size" not in line:
+                continue
+            match = FUNCTION_SIZE_PATTERN.search(line)
             if match:
                 sizes.append(int(match.group(1)))
                 line_numbers.append(i)
@@ -76,13 +80,17 @@ def main():
         f"Found {len(old_sizes)} functions in old file and {len(new_sizes)} functions in new file"
     )
 
-    differences = 0
-    for i in range(min_length):
-        if old_sizes[i] != new_sizes[i]:
-            differences += 1
-            print(
-                f"Function #{i+1} differs: old[line {old_lines[i]}]={old_sizes[i]}, new[line {new_lines[i]}]={new_sizes[i]}, diff={new_sizes[i] - old_sizes[i]}"
-            )
+    # zip stops at min_length, only differing functions reach the formatting below
+    diff_indexes = [
+        i
+        for i, (old_size, new_size) in enumerate(zip(old_sizes, new_sizes))
+        if old_size != new_size
+    ]
+    differences = len(diff_indexes)
+    for i in diff_indexes:
+        print(
+            f"Function #{i+1} differs: old[line {old_lines[i]}]={old_sizes[i]}, new[line {new_lines[i]}]={new_sizes[i]}, diff={new_sizes[i] - old_sizes[i]}"
+        )
 
     # Check for extra functions
     if len(old_sizes) > len(new_sizes):
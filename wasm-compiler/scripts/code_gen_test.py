@@ -43,28 +43,27 @@ for _, module in targets.items():
 
 
 def collect_cases(root: str) -> List[str]:
-    files = []
-    for path in os.listdir(root):
-        if path.endswith(".wat"):
-            fullpath = os.path.join(root, path)
-            files.append(fullpath)
-    return files
+    return [
+        entry.path
+        for entry in os.scandir(root)
+        if entry.name.endswith(".wat") and entry.is_file()
+    ]
 
 
-def run(case_path: str, args) -> bool:
-    wat = open(case_path).read()
+def run(case_path: str, wasm_binary: bytes, args) -> bool:
+    with open(case_path, "rb") as f:
+        has_memory = wat_parser.has_memory(f.read())
 
     for target_name, module in targets.items():
         if args.backend is not None and target_name != args.backend:
             continue
 
         compiler = module.Compiler()
-        wasm_binary = wasm_utils.wat_to_wasm(path=case_path)
         dis_lines = compiler.disassemble_wasm(wasm_binary)
         config = dis.parse_config_str(module.get_configuration())
         file_check_prefix = file_check.convert_config_to_file_check_prefix(config)
         dis_output, _ = dis.process_dis_output(
-            dis_lines=dis_lines, config=config, has_memory=wat_parser.has_memory(wat)
+            dis_lines=dis_lines, config=config, has_memory=has_memory
         )
 
         is_success, _, stderr = file_check.check_file(
@@ -100,12 +99,14 @@ if __name__ == "__main__":
     assert args.backend is None or args.backend in targets
 
     failed_case_count = 0
-    cases_path = collect_cases(root=test_suites)
-    for case_path in cases_path:
-        if args.case is not None and case_path != os.path.abspath(args.case):
-            continue
+    if args.case is not None:
+        cases_path = [os.path.abspath(args.case)]
+    else:
+        cases_path = collect_cases(root=test_suites)
+    wasm_binaries = wasm_utils.wat_to_wasm_many(cases_path)
+    for case_path, wasm_binary in zip(cases_path, wasm_binaries):
         print(f"run {case_path}")
-        is_success = run(case_path=case_path, args=args)
+        is_success = run(case_path=case_path, wasm_binary=wasm_binary, args=args)
         if not is_success:
             failed_case_count += 1
     if failed_case_count > 0:
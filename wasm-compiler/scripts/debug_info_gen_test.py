@@ -17,7 +17,7 @@
 from math import exp
 import os
 import sys
-from typing import List, Dict
+from typing import List, Dict, Set, Tuple
 import argparse
 from helper import dis, wat_parser, wasm_utils, dwarf, file_check
 
@@ -57,27 +57,27 @@ class DebugLineMapping:
         return f"{self.wat_line_index+1}: {self.assembly_line}"
 
 
-def get_output(module, wat_str: str, config: Dict[str, str]):
-    wasm = wasm_utils.wat_to_wasm(wat=wat_str.encode("utf-8"))
+def get_output(module, wat: bytes, has_memory: bool, config: Dict[str, str]):
+    wasm = wasm_utils.wat_to_wasm(wat=wat, cache_on_disk=True)
     compiler = module.Compiler()
     compiler.set_stacktrace_record_count(1)
     compiler.enable_dwarf(True)
     dis_lines = compiler.disassemble_wasm(wasm)
     dwo: bytes = compiler.get_dwarf_object()
     assembly, _ = dis.process_dis_output(
-        dis_lines=dis_lines, config=config, has_memory=wat_parser.has_memory(wat_str)
+        dis_lines=dis_lines, config=config, has_memory=has_memory
     )
     wat_line_to_assembly_line = dwarf.analyze_debug_info_in_dwarf(
         dwo=dwo,
         wasm=wasm,
         assembly=assembly,
     )
-    wat_line_to_assembly_line = list(wat_line_to_assembly_line.items())
-    # ordered by wat line number
-    wat_line_to_assembly_line.sort(key=lambda x: x[0])
     assembly_list = assembly.split("\n")
     results: List[DebugLineMapping] = []
-    for wat_line_index, assembly_line_indexes in wat_line_to_assembly_line:
+    # ordered by wat line number
+    for wat_line_index, assembly_line_indexes in sorted(
+        wat_line_to_assembly_line.items()
+    ):
         for assembly_line_index in assembly_line_indexes:
             assembly_line = assembly_list[assembly_line_index]
             first_space = assembly_line.find(" ")
@@ -93,12 +93,11 @@ def get_output(module, wat_str: str, config: Dict[str, str]):
 
 
 def collect_cases(root: str) -> List[str]:
-    files = []
-    for path in os.listdir(root):
-        if path.endswith(".wat"):
-            fullpath = os.path.join(root, path)
-            files.append(fullpath)
-    return files
+    return [
+        entry.path
+        for entry in os.scandir(root)
+        if entry.name.endswith(".wat") and entry.is_file()
+    ]
 
 
 def get_check_prefix(base_prefix: str, is_next: bool) -> str:
@@ -106,90 +105,108 @@ def get_check_prefix(base_prefix: str, is_next: bool) -> str:
 
 
 def run(case_path: str, args) -> bool:
-    wat_str = open(case_path, "r").read()
+    with open(case_path, "rb") as f:
+        wat = f.read()
+    has_memory = wat_parser.has_memory(wat)
+    wat_text = wat.decode("utf-8")
     prefix_map: Dict[str, str] = {}
-    expected_debug_info_map: Dict[str, List[DebugLineMapping]] = {}
+    expected_debug_info_buckets: Dict[str, Dict[int, List[DebugLineMapping]]] = {}
     expected_dwo_dump_map: Dict[str, str] = {}
     for target_name, module in targets.items():
         if args.backend is not None and target_name != args.backend:
             continue
         config = dis.parse_config_str(module.get_configuration())
-        expected_debug_info, dwo_dump = get_output(module, wat_str, config)
+        expected_debug_info, dwo_dump = get_output(module, wat, has_memory, config)
         if args.update:
             short_prefix = file_check.convert_config_to_file_check_short_prefix(config)
             assert short_prefix != None
             print(f"updating {short_prefix}")
-            expected_debug_info_map[target_name] = expected_debug_info
+            # group by wat line so the update loop does one lookup per wat line
+            buckets: Dict[int, List[DebugLineMapping]] = {}
+            for info in expected_debug_info:
+                buckets.setdefault(info.wat_line_index, []).append(info)
+            expected_debug_info_buckets[target_name] = buckets
             expected_dwo_dump_map[target_name] = dwo_dump
             prefix_map[target_name] = short_prefix
         else:
             file_check_prefix = file_check.convert_config_to_file_check_short_prefix(
                 config
             )
-            is_success, _, stderr = file_check.check_file(
-                case_path,
-                "\n".join([info.to_string() for info in expected_debug_info]),
-                [file_check_prefix],
-                args.color,
-            )
-            if not is_success:
-                print(config)
-                print(file_check_prefix)
-                print("==================== START PATTERN ====================")
-                print(stderr)
-                print("====================  END  PATTERN ====================")
-                return False
             dwo_file_check_prefix = get_dwo_file_check_prefix(file_check_prefix)
+            # DWO checks are emitted after all debug line checks, so both outputs can
+            # be verified by one FileCheck invocation on the concatenated input
+            line_check_pos = wat_text.rfind(f";; {file_check_prefix}")
+            dwo_check_pos = wat_text.find(f";; {dwo_file_check_prefix}")
+            if line_check_pos == -1 or dwo_check_pos == -1:
+                print(
+                    f"{case_path}: missing {file_check_prefix} or {dwo_file_check_prefix} checks"
+                )
+                return False
+            if line_check_pos > dwo_check_pos:
+                print(
+                    f"{case_path}: {dwo_file_check_prefix} checks must follow all {file_check_prefix} checks"
+                )
+                return False
             is_success, _, stderr = file_check.check_file(
                 case_path,
-                dwo_dump,
-                [dwo_file_check_prefix],
+                "\n".join(
+                    [info.to_string() for info in expected_debug_info] + [dwo_dump]
+                ),
+                [file_check_prefix, dwo_file_check_prefix],
                 args.color,
             )
             if not is_success:
                 print(config)
-                print(dwo_file_check_prefix)
+                print(f"{file_check_prefix},{dwo_file_check_prefix}")
                 print("==================== START PATTERN ====================")
                 print(stderr)
                 print("====================  END  PATTERN ====================")
                 return False
     if args.update:
-        wat_lines = wat_str.split("\n")
+        wat_lines = wat_text.split("\n")
         new_wat_lines = [";; auto-generated by scripts/debug_info_gen_test.py --update"]
-        debug_info_indexes: Dict[str, int] = {}
-        for target_name, _ in expected_debug_info_map.items():
-            debug_info_indexes[target_name] = 0
+
+        skippable = {
+            i
+            for i, wat_line in enumerate(wat_lines)
+            if wat_line.startswith(";;") or len(wat_line) == 0
+        }
 
         def skip(current: int) -> int:
             next = current
-            while next < len(wat_lines) and (
-                wat_lines[next].startswith(";;") or len(wat_lines[next]) == 0
-            ):
+            while next in skippable:
                 next += 1
             return next
 
+        # (first, next) check prefix per target, formatted once instead of per line
+        check_prefixes: Dict[str, Tuple[str, str]] = {
+            target_name: (
+                get_check_prefix(prefix, False),
+                get_check_prefix(prefix, True),
+            )
+            for target_name, prefix in prefix_map.items()
+        }
+
+        # targets whose first mapping has been emitted, later ones use -NEXT
+        emitted_targets: Set[str] = set()
         wat_line_index = skip(0)
         while wat_line_index < len(wat_lines):
             wat_line = wat_lines[wat_line_index]
             new_wat_lines.append(wat_line)
             file_check_line_offset = 0
-            for target_name, expected_debug_info in expected_debug_info_map.items():
-                debug_info_index = debug_info_indexes[target_name]
+            for target_name, buckets in expected_debug_info_buckets.items():
                 # emit all related instruction after corresponded wat line
-                while (
-                    debug_info_index < len(expected_debug_info)
-                    and expected_debug_info[debug_info_index].wat_line_index
-                    == wat_line_index
-                ):
+                first_prefix, next_prefix = check_prefixes[target_name]
+                for info in buckets.get(wat_line_index, ()):
                     file_check_line_offset += 1
-                    file_check_prefix = get_check_prefix(
-                        prefix_map[target_name], debug_info_index != 0
-                    )
+                    if target_name in emitted_targets:
+                        file_check_prefix = next_prefix
+                    else:
+                        file_check_prefix = first_prefix
+                        emitted_targets.add(target_name)
                     new_wat_lines.append(
-                        f";; {file_check_prefix} [[@LINE-{file_check_line_offset}]]: {expected_debug_info[debug_info_index].assembly_line}"
+                        f";; {file_check_prefix} [[@LINE-{file_check_line_offset}]]: {info.assembly_line}"
                     )
-                    debug_info_index += 1
-                debug_info_indexes[target_name] = debug_info_index
             wat_line_index = skip(wat_line_index + 1)
 
             new_wat_lines.append("")
@@ -229,10 +246,11 @@ if __name__ == "__main__":
     assert args.backend is None or args.backend in targets
 
     failed_case_count = 0
-    cases_path = collect_cases(root=test_suites)
+    if args.case is not None:
+        cases_path = [os.path.abspath(args.case)]
+    else:
+        cases_path = collect_cases(root=test_suites)
     for case_path in cases_path:
-        if args.case is not None and case_path != os.path.abspath(args.case):
-            continue
         print(f"run {case_path}")
         is_success = run(case_path=case_path, args=args)
         if not is_success:
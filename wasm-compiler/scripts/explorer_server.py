@@ -51,11 +51,11 @@ def create_error_response_json(msg: str) -> Dict[str, str]:
 
 def analyze_wat(wat: str) -> List[Dict[str, Tuple[int, int]]]:
     func_ranges = wat_parser.extract_func(wat)
-    lines = wat.split("\n")
+    line_index = wat_parser.LineIndex(wat.split("\n"))
     return [
         {
-            "start": wat_parser.offset_to_position(lines, func_range.start),
-            "end": wat_parser.offset_to_position(lines, func_range.end),
+            "start": line_index.locate(func_range.start),
+            "end": line_index.locate(func_range.end),
         }
         for func_range in func_ranges
     ]
@@ -64,6 +64,11 @@ def analyze_wat(wat: str) -> List[Dict[str, Tuple[int, int]]]:
 def disassemble_wat(module, wat: bytes) -> dict:
     if len(wat) == 0:
         return create_error_response_json("Empty input")
+    # has_memory and analyze_wat share the wat_parser scan when given the same str
+    try:
+        wat_str: str = wat.decode()
+    except UnicodeDecodeError as e:
+        return create_error_response_json("Input is not valid UTF-8\n" + str(e))
     try:
         wasm = wasm_utils.wat_to_wasm(wat=wat)
     except Exception as e:
@@ -82,9 +87,8 @@ def disassemble_wat(module, wat: bytes) -> dict:
     dis_output, dis_func_positions = dis.process_dis_output(
         dis_lines=dis_lines,
         config=config,
-        has_memory=wat_parser.has_memory(wat.decode()),
+        has_memory=wat_parser.has_memory(wat_str),
     )
-    wat_str: str = wat.decode()
     return {
         "config": config,
         "text": dis_output,
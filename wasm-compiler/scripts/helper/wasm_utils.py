@@ -12,40 +12,108 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import os
 import subprocess
+import tempfile
+from typing import List
 
+wat_to_wasm_cache_dir = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "wasm-compiler",
+    "wat2wasm",
+)
 
-def wat_to_wasm(*, path: str | None = None, wat: bytes | None = None) -> bytes:
+
+@functools.lru_cache(maxsize=None)
+def _wasm_tools_version() -> bytes:
+    proc = subprocess.run(
+        ["wasm-tools", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return proc.stdout
+
+
+def _run_wasm_tools(path: str | None, wat: bytes | None) -> bytes:
+    # no shell and no /dev/std* indirection, "-" reads the wat from stdin and the
+    # binary is written to stdout when no output file is given
+    proc = subprocess.run(
+        ["wasm-tools", "parse", "--generate-dwarf=lines", path or "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        input=wat,
+    )
+    if proc.returncode != 0:
+        raise Exception(proc.stderr.decode())
+    return proc.stdout
+
+
+def _wat_to_wasm_cached(path: str | None, wat: bytes, cache_on_disk: bool) -> bytes:
+    # the input path ends up in the generated DWARF, so it is part of the key
+    hasher = hashlib.sha256(_wasm_tools_version())
+    hasher.update(b"\0" + (path or "").encode() + b"\0")
+    hasher.update(wat)
+    return _wat_to_wasm_by_digest(hasher.hexdigest(), path, wat, cache_on_disk)
+
+
+# bounded, long running callers like explorer_server convert arbitrary inputs
+@functools.lru_cache(maxsize=256)
+def _wat_to_wasm_by_digest(
+    digest: str, path: str | None, wat: bytes, cache_on_disk: bool
+) -> bytes:
+    if not cache_on_disk:
+        return _run_wasm_tools(path, None if path is not None else wat)
+    cache_path = os.path.join(wat_to_wasm_cache_dir, digest + ".wasm")
+    try:
+        with open(cache_path, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+    wasm = _run_wasm_tools(path, None if path is not None else wat)
+    try:
+        os.makedirs(wat_to_wasm_cache_dir, exist_ok=True)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=wat_to_wasm_cache_dir)
+        with os.fdopen(tmp_fd, "wb") as tmp_file:
+            tmp_file.write(wasm)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # the cache is best effort, e.g. read-only home directories
+        pass
+    return wasm
+
+
+def wat_to_wasm(
+    *, path: str | None = None, wat: bytes | None = None, cache_on_disk: bool = False
+) -> bytes:
     """
-    generate wasm binary from wat file or wat string
+    generate wasm binary from wat file or wat string, cached by content
+
+    results for files are also kept on disk across runs, wat strings only when
+    cache_on_disk is set
     """
     if path is not None:
         assert wat is None
-        proc = subprocess.run(
-            f"wasm-tools parse --generate-dwarf=lines -o /dev/stdout '{path}'",
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        if proc.returncode != 0:
-            raise Exception(proc.stderr.decode())
-        return proc.stdout
+        with open(path, "rb") as f:
+            return _wat_to_wasm_cached(path, f.read(), True)
     elif wat is not None:
         assert path is None
-        proc = subprocess.run(
-            f"wasm-tools parse --generate-dwarf=lines -o /dev/stdout /dev/stdin",
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            input=wat,
-        )
-        if proc.returncode != 0:
-            raise Exception(proc.stderr.decode())
-        return proc.stdout
+        return _wat_to_wasm_cached(None, wat, cache_on_disk)
     else:
         assert False
 
 
+def wat_to_wasm_many(paths: List[str]) -> List[bytes]:
+    """
+    generate wasm binaries for many wat files, running wasm-tools in parallel
+    """
+    # resolve the version once before the workers need it for their cache key
+    _wasm_tools_version()
+    # the GIL is released while waiting for the wasm-tools processes
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return list(executor.map(lambda path: wat_to_wasm(path=path), paths))
+
+
 def load_wasm_or_wat(path: str) -> bytes:
     """
     load wasm binary from path
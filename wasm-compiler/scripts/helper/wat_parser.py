@@ -12,17 +12,33 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
+import functools
+import itertools
+import re
 from typing import List, Tuple
 
 
-def offset_to_position(lines: List[str], offset: int) -> Tuple[int, int]:
-    cursor = 0
-    for line_number in range(len(lines)):
-        old_cursor = cursor
-        cursor += len(lines[line_number]) + 1  # patch '\n' again
-        if offset >= old_cursor and offset < cursor:
-            return line_number, offset - old_cursor
-    return len(lines), 0
+_head_token_pattern = re.compile(r"\s*([^\s()]*)")
+_head_token_bytes_pattern = re.compile(rb"\s*([^\s()]*)")
+
+
+class LineIndex:
+    """
+    maps offsets in a text to (line, column) with a binary search over line starts
+    """
+
+    def __init__(self, lines: List[str]):
+        # patch '\n' again for every line
+        self.starts = list(
+            itertools.accumulate((len(line) + 1 for line in lines), initial=0)
+        )
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        i = bisect.bisect_right(self.starts, offset)
+        if i == 0 or i == len(self.starts):
+            return len(self.starts) - 1, 0
+        return i - 1, offset - self.starts[i - 1]
 
 
 class Range:
@@ -44,33 +60,60 @@ class Range:
         return self.start != -1 and self.end != -1
 
 
-def split_sub_expr(wat: str, r: Range) -> List[Range]:
+def split_sub_expr(wat: str | bytes, r: Range) -> List[Range]:
     """
     [begin, end]
     """
     subs = []
     current_start = None
     depth = -1
-    for i in range(r.start, r.end + 1):
-        if wat[i] == "(":
+    end = r.end + 1
+    # bytes are scanned as is, so callers holding raw file content can skip decoding
+    open_paren, close_paren = ("(", ")") if isinstance(wat, str) else (b"(", b")")
+    # jump between parentheses instead of visiting every character
+    next_open = wat.find(open_paren, r.start, end)
+    next_close = wat.find(close_paren, r.start, end)
+    while next_open != -1 or next_close != -1:
+        if next_open != -1 and (next_close == -1 or next_open < next_close):
             depth += 1
             if depth == 1:
-                current_start = i
-        elif wat[i] == ")":
+                current_start = next_open
+            next_open = wat.find(open_paren, next_open + 1, end)
+        else:
             depth -= 1
             if depth == 0:
                 assert current_start is not None
-                subs.append(Range(current_start, i))
+                subs.append(Range(current_start, next_close))
                 current_start = None
-                continue
+            next_close = wat.find(close_paren, next_close + 1, end)
     return subs
 
 
-def get_sub_expr(wat: str, r: Range) -> str:
-    return wat[r.start + 1 : r.end].strip()
+def get_sub_expr_head(wat: str | bytes, r: Range) -> str:
+    """
+    first token of the sub expression, e.g. "func" for "(func $f ...)"
+    """
+    # match in place, slicing would copy the whole function body
+    if isinstance(wat, str):
+        return _head_token_pattern.match(wat, r.start + 1, r.end).group(1)
+    return _head_token_bytes_pattern.match(wat, r.start + 1, r.end).group(1).decode()
+
+
+@functools.lru_cache(maxsize=1)
+def _scan_top_level(wat: str | bytes) -> List[Tuple[Range, str]]:
+    """
+    sub expressions of the module together with their head token, shared by
+    extract_func and has_memory so the wat is only scanned once
+    """
+    if len(wat) == 0:
+        return []
+    return [
+        (sub_range, get_sub_expr_head(wat, sub_range))
+        for sub_range in split_sub_expr(wat, Range(0, len(wat) - 1))
+    ]
 
 
-def extract_func_impl(wat: str, extract_range: Range) -> List[Range]:
+def extract_func(wat: str) -> List[Range]:
     """
     Extracts function definitions from a wat string.
 
@@ -81,24 +124,9 @@ def extract_func_impl(wat: str, extract_range: Range) -> List[Range]:
         list: A list of function definitions.
     """
     assert len(wat) != 0
-    ranges: List[Range] = []
-    sub_ranges = split_sub_expr(wat, extract_range)
-    for sub_range in sub_ranges:
-        sub_expr = get_sub_expr(wat, sub_range)
-        if sub_expr.startswith("func"):
-            ranges.append(sub_range)
-        # FIXME: Does here need recursive search?
-    return ranges
-
-
-def extract_func(wat: str) -> List[Range]:
-    return extract_func_impl(wat, extract_range=Range(0, len(wat) - 1))
+    # FIXME: Does here need recursive search?
+    return [sub_range for sub_range, head in _scan_top_level(wat) if head == "func"]
 
 
-def has_memory(wat: str) -> bool:
-    sub_ranges = split_sub_expr(wat, Range(0, len(wat) - 1))
-    for sub_range in sub_ranges:
-        sub_expr = get_sub_expr(wat, sub_range)
-        if sub_expr.startswith("memory"):
-            return True
-    return False
+def has_memory(wat: str | bytes) -> bool:
+    return any(head == "memory" for _, head in _scan_top_level(wat))
@@ -12,8 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import paramiko, subprocess, time, argparse
-from scp import SCPClient
+import paramiko, subprocess, time, argparse, select, os, sys
 
 
 parser = argparse.ArgumentParser(description="A script with a command-line argument.")
@@ -60,6 +59,10 @@ for i in range(0, 120):
         # Set up keep-alive mechanism (sends a packet every 60 seconds)
         transport = ssh.get_transport()
         transport.set_keepalive(10)
+        # Larger window and packets for channels opened from here on, the
+        # paramiko defaults throttle bulk uploads to a fraction of the link
+        transport.default_window_size = 2**27
+        transport.default_max_packet_size = 2**19
         break  # Connection successful, exit the retry loop
     except Exception as e:
         print(f"SSH connect failed: {str(e)}, retry attempt {i+1}/120")
@@ -69,16 +72,31 @@ for i in range(0, 120):
             exit(1)
 
 print("ssh connected.")
-# Transfer file
-local_file1 = vb_spectest_json_path
-local_file2 = testcases_json_path
-remote_file_path1 = "/tmp/vb_spectest_json"
-remote_file_path2 = "/tmp/testcases.json"
-
-scp = SCPClient(ssh.get_transport())
-
-scp.put(local_file1, remote_file_path1)
-scp.put(local_file2, remote_file_path2)
+# Transfer files
+# Stream both files through one tar pipe so they share a single channel
+# instead of paying one SCP handshake per file
+local_files = [vb_spectest_json_path, testcases_json_path]
+remote_dir = "/tmp"
+
+tar_cmd = ["tar", "-cf", "-"]
+for local_file in local_files:
+    # -C is applied relative to the previous one, so pass absolute directories
+    local_dir = os.path.dirname(os.path.abspath(local_file))
+    tar_cmd += ["-C", local_dir, os.path.basename(local_file)]
+tar_proc = subprocess.Popen(tar_cmd, stdout=subprocess.PIPE)
+
+tar_stdin, tar_stdout, tar_stderr = ssh.exec_command(f"tar -xf - -C {remote_dir}")
+tar_channel = tar_stdin.channel
+while True:
+    chunk = tar_proc.stdout.read(1024 * 1024)
+    if not chunk:
+        break
+    tar_channel.sendall(chunk)
+tar_channel.shutdown_write()
+
+if tar_proc.wait() != 0 or tar_channel.recv_exit_status() != 0:
+    print("Transfer failed:", tar_stderr.read().decode("utf-8"))
+    exit(1)
 
 
 # execute command
@@ -89,32 +107,33 @@ stdin, stdout, stderr = ssh.exec_command(
 )
 
 # Stream the output in real-time
-print("Command Output:")
-while not stdout.channel.exit_status_ready():
-    # Check and read stdout
-    if stdout.channel.recv_ready():
-        output = stdout.channel.recv(1024).decode("utf-8")
-        print(output, end="", flush=True)
+print("Command Output:", flush=True)
+channel = stdout.channel
+while True:
+    # Block until the channel has data (or exit status) instead of polling
+    select.select([channel], [], [], 1.0)
+
+    # Check and read stdout, forward the raw bytes so a multi-byte character
+    # split across two reads is not decoded on its own
+    if channel.recv_ready():
+        sys.stdout.buffer.write(channel.recv(65536))
+        sys.stdout.buffer.flush()
 
     # Check and read stderr
-    if stderr.channel.recv_stderr_ready():
-        error_output = stderr.channel.recv_stderr(1024).decode("utf-8")
-        print(error_output, end="", flush=True)
-
-    # Small delay to prevent high CPU usage
-    time.sleep(0.1)
-
-# Get any remaining output from both stdout and stderr
-if stdout.channel.recv_ready():
-    output = stdout.channel.recv(1024).decode("utf-8")
-    print(output, end="", flush=True)
-
-if stderr.channel.recv_stderr_ready():
-    error_output = stderr.channel.recv_stderr(1024).decode("utf-8")
-    print(error_output, end="", flush=True)
+    if channel.recv_stderr_ready():
+        sys.stdout.buffer.write(channel.recv_stderr(65536))
+        sys.stdout.buffer.flush()
+
+    # Stop once the command exited and all output has been drained
+    if (
+        channel.exit_status_ready()
+        and not channel.recv_ready()
+        and not channel.recv_stderr_ready()
+    ):
+        break
 
 # Get the return code
-return_code = stdout.channel.recv_exit_status()
+return_code = channel.recv_exit_status()
 print("Spectest Return Code:", return_code)
 
 stdin.close()
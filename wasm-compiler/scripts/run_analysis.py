@@ -13,15 +13,17 @@
 # limitations under the License.
 
 import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
 from io import TextIOWrapper
 import math
 import os
+import statistics
 import sys
-from statistics import geometric_mean
 import importlib
 from helper import dwarf, wasm_parser
 from collections import defaultdict
-from typing import Dict
+from types import ModuleType
+from typing import Dict, List, Set, Tuple
 
 vb_targets = [
     "aarch64_vb_warp",
@@ -32,69 +34,69 @@ vb_targets = [
 ]
 
 
-parser = argparse.ArgumentParser(
-    description="Helper script to automatically run jit code benchmarks for wasm-compiler for CI"
-)
-parser.add_argument(
-    "-i", "--input", help="Path to the wasm-compiler-benchmark folder", required=True
-)
-parser.add_argument("-o", "--output", help="Path to the report")
-parser.add_argument(
-    "--detail", help="Path to the detail report, will output in markdown format"
-)
-parser.add_argument(
-    "--cost-model-prefix",
-    help="Path to the cost model report, will output in plain text",
-)
+target_indexes: Dict[str, int] = {
+    target_name: index for index, target_name in enumerate(vb_targets)
+}
 
-args = parser.parse_args()
 
-output_file = open(args.output, "w") if args.output else sys.stdout
-detail_file = open(args.detail, "w") if args.detail else sys.stdout
-
-
-cost_model_file: Dict[str, TextIOWrapper] | None = (
-    dict(
-        [
-            [target_name, open(f"{args.cost_model_prefix}_{target_name}.txt", "w")]
-            for target_name in vb_targets
-        ]  # type: ignore
-    )  # type: ignore
-    if args.cost_model_prefix
-    else None
-)
-
-usecaseFolder = os.path.join(args.input, "usecases")
-modules = []
-for path in os.listdir(usecaseFolder):
-    usecase_folder_path = os.path.join(usecaseFolder, path)
-    if not os.path.isdir(usecase_folder_path):
-        continue
-    for path in os.listdir(usecase_folder_path):
-        if path.endswith("wasm"):
-            modules.append(os.path.join(usecase_folder_path, path))
+class OpcodeCost:
+    """
+    count and costs are indexed by the position of the target in vb_targets
+    """
 
+    __slots__ = ("count", "costs")
 
-class OpcodeCost:
     def __init__(self):
-        self.count = defaultdict(int)
-        self.costs = defaultdict(float)
+        self.count: List[int] = [0] * len(vb_targets)
+        self.costs: List[float] = [0.0] * len(vb_targets)
 
 
 opcode_cost_statistic: defaultdict[str, OpcodeCost] = defaultdict(lambda: OpcodeCost())
 
+# backend modules imported once per worker process
+vb_warp_modules: Dict[str, ModuleType] = {}
+
+
+def import_vb_targets():
+    for target_name in vb_targets:
+        vb_warp_modules[target_name] = importlib.import_module(name=target_name)
 
-def analyzer_opcode_size(target_name: str, wasm: bytes, dwarf_binary: bytes):
-    function_offsets = wasm_parser.get_func_offsets(wasm)
-    for wasm_offset, machine_code_offsets in dwarf.decode_dwarf(dwarf_binary).items():
-        if wasm_offset in function_offsets:
-            wasm_opcode_str = "func"
-        else:
-            wasm_opcode_str = wasm_parser.get_wasm_op_code_str(wasm, wasm_offset)
-        assert not wasm_opcode_str.startswith("unknown"), wasm_opcode_str
-        opcode_cost_statistic[wasm_opcode_str].count[target_name] += 1
-        cost = len(machine_code_offsets)
-        opcode_cost_statistic[wasm_opcode_str].costs[target_name] += cost
+
+def gmean(values: List[float]) -> float:
+    """
+    statistics.geometric_mean, including its 3.13 behaviour for zero values
+    """
+    if len(values) == 0:
+        raise statistics.StatisticsError("geometric mean requires a non-empty dataset")
+    if any(value == 0 for value in values):
+        return 0.0
+    return math.exp(math.fsum(math.log(value) for value in values) / len(values))
+
+
+def analyzer_opcode_size(
+    target_name: str,
+    wasm: bytes,
+    function_offsets: Set[int],
+    wasm_opcode_strs: Dict[int, str],
+    machine_code_sizes: Dict[int, int],
+):
+    """
+    wasm_opcode_strs caches the opcode at each wasm offset, it only depends on the
+    module so it is shared by all targets
+    """
+    target_index = target_indexes[target_name]
+    for wasm_offset, machine_code_size in machine_code_sizes.items():
+        wasm_opcode_str = wasm_opcode_strs.get(wasm_offset)
+        if wasm_opcode_str is None:
+            if wasm_offset in function_offsets:
+                wasm_opcode_str = "func"
+            else:
+                wasm_opcode_str = wasm_parser.get_wasm_op_code_str(wasm, wasm_offset)
+            assert not wasm_opcode_str.startswith("unknown"), wasm_opcode_str
+            wasm_opcode_strs[wasm_offset] = wasm_opcode_str
+        item = opcode_cost_statistic[wasm_opcode_str]
+        item.count[target_index] += 1
+        item.costs[target_index] += machine_code_size
 
 
 def finalized_opcode_cost():
@@ -104,74 +106,164 @@ def finalized_opcode_cost():
     print(f"| wasm_opcode | count | {cost_header} |", file=detail_file)
     print(f"|-------------|-------|{cost_sep}|", file=detail_file)
     statistic = list(opcode_cost_statistic.items())
-    statistic.sort(key=lambda item: sum(item[1].count.values()), reverse=True)
+    statistic.sort(key=lambda item: sum(item[1].count), reverse=True)
+    # collect all rows first and write every file once
+    cost_model_lines: List[List[str]] = [[] for _ in vb_targets]
+    detail_rows: List[str] = []
     for wasm_opcode_str, item in statistic:
-        for target_name in vb_targets:
-            if item.count[target_name] > 0:
-                item.costs[target_name] = (
-                    item.costs[target_name] / item.count[target_name]
+        for target_index in range(len(vb_targets)):
+            if item.count[target_index] > 0:
+                item.costs[target_index] = (
+                    item.costs[target_index] / item.count[target_index]
                 )
             else:
-                item.costs[target_name] = math.inf
-            if cost_model_file is not None:
-                print(
-                    wasm_opcode_str,
-                    item.costs[target_name],
-                    file=cost_model_file[target_name],
-                )
+                item.costs[target_index] = math.inf
+            cost_model_lines[target_index].append(
+                f"{wasm_opcode_str} {item.costs[target_index]}\n"
+            )
 
-        final_count = sum(item.count.values()) / len(vb_targets) / len(modules)
-        cost_breakdown = " | ".join(
-            [f"{item.costs[target_name]:.2f}" for target_name in vb_targets]
-        )
-        print(
-            f"|{wasm_opcode_str} | {final_count} | {cost_breakdown} |",
-            file=detail_file,
-        )
+        final_count = sum(item.count) / len(vb_targets) / len(modules)
+        cost_breakdown = " | ".join([f"{cost:.2f}" for cost in item.costs])
+        detail_rows.append(f"|{wasm_opcode_str} | {final_count} | {cost_breakdown} |\n")
+    detail_file.write("".join(detail_rows))
+    if cost_model_file is not None:
+        for target_index, target_name in enumerate(vb_targets):
+            cost_model_file[target_name].writelines(cost_model_lines[target_index])
+
+
+def analyze_one(
+    target_name: str, wasm: bytes
+) -> Tuple[Dict[str, float] | None, str, Dict[int, int]]:
+    """
+    compile one module for one target, runs in a worker process and returns the
+    machine code size of every wasm offset in the debug info
+    """
+    vb_warp = vb_warp_modules[target_name]
+    module_size = len(wasm)
+    compiler = vb_warp.Compiler()
+    compiler.enable_dwarf(True)
+    compiler.enable_analytics(True)
+    try:
+        compiler.compile(wasm)
+    except Exception as e:
+        return None, f"Error: {e}", {}
+    dwarf_binary = compiler.get_dwarf_object()
+    debug_lines = dwarf.decode_dwarf(dwarf_binary)
+    machine_code_sizes = {
+        wasm_offset: len(machine_code_offsets)
+        for wasm_offset, machine_code_offsets in debug_lines.items()
+    }
+
+    jit_size = compiler.get_jit_size()
+    spills = compiler.get_spills_to_stack() + compiler.get_spills_to_reg()
+    result = {
+        "in_out_ratio": jit_size / module_size,
+        "spills": spills,
+    }
+    detail = f"module size: {module_size} jit size: {jit_size} spills: {spills}\n"
+    return result, detail, machine_code_sizes
 
 
 def run_analyze(modules):
-    for target_name in vb_targets:
-        vb_warp = importlib.import_module(name=target_name)
-        outputs = []
-        print(f"\n\n## {target_name}\n", file=detail_file)
-        for wasm in modules:
-            short_name = (
-                os.path.split(os.path.split(wasm)[0])[1] + "/" + os.path.split(wasm)[1]
-            )
-            print(f"### {short_name}\n", file=detail_file)
-            wasm = open(wasm, "rb").read()
-            module_size = len(wasm)
-            compiler = vb_warp.Compiler()
-            compiler.enable_dwarf(True)
-            compiler.enable_analytics(True)
-            try:
-                compiler.compile(wasm)
-            except Exception as e:
-                print(f"Error: {e}", file=detail_file)
-                continue
-            dwarf_binary = compiler.get_dwarf_object()
-            analyzer_opcode_size(target_name, wasm, dwarf_binary)
-
-            jit_size = compiler.get_jit_size()
-            spills = compiler.get_spills_to_stack() + compiler.get_spills_to_reg()
-            result = {
-                "in_out_ratio": jit_size / module_size,
-                "spills": spills,
-            }
-            outputs.append(result)
+    # read every module once, shared by all targets
+    wasm_blobs: Dict[str, bytes] = {}
+    for wasm_path in modules:
+        with open(wasm_path, "rb") as f:
+            wasm_blobs[wasm_path] = f.read()
+    # parsed lazily on the first successful compile, then shared by all targets
+    wasm_function_offsets: Dict[str, Set[int]] = {}
+    wasm_opcode_strs: Dict[str, Dict[int, str]] = defaultdict(dict)
+    with ProcessPoolExecutor(
+        max_workers=os.cpu_count(), initializer=import_vb_targets
+    ) as executor:
+        # every (target, module) pair compiles independently, submit all of them
+        # up front and report in submission order to keep the output stable
+        futures: Dict[str, List[Future]] = {
+            target_name: [
+                executor.submit(analyze_one, target_name, wasm_blobs[wasm_path])
+                for wasm_path in modules
+            ]
+            for target_name in vb_targets
+        }
+        for target_name in vb_targets:
+            outputs = []
+            print(f"\n\n## {target_name}\n", file=detail_file)
+            for wasm_path, future in zip(modules, futures[target_name]):
+                short_name = (
+                    os.path.split(os.path.split(wasm_path)[0])[1]
+                    + "/"
+                    + os.path.split(wasm_path)[1]
+                )
+                print(f"### {short_name}\n", file=detail_file)
+                result, detail, machine_code_sizes = future.result()
+                print(detail, file=detail_file)
+                if result is None:
+                    continue
+                wasm = wasm_blobs[wasm_path]
+                if wasm_path not in wasm_function_offsets:
+                    wasm_function_offsets[wasm_path] = set(
+                        wasm_parser.get_func_offsets(wasm)
+                    )
+                analyzer_opcode_size(
+                    target_name,
+                    wasm,
+                    wasm_function_offsets[wasm_path],
+                    wasm_opcode_strs[wasm_path],
+                    machine_code_sizes,
+                )
+                outputs.append(result)
+            mean_in_out_ratio = gmean([o["in_out_ratio"] for o in outputs])
+            mean_spills = gmean([o["spills"] for o in outputs])
             print(
-                f"module size: {module_size} jit size: {jit_size} spills: {spills}\n",
-                file=detail_file,
+                f"{target_name} size score: {mean_in_out_ratio} spills score: {mean_spills}",
+                file=output_file,
             )
-        mean_in_out_ratio = geometric_mean([o["in_out_ratio"] for o in outputs])
-        mean_spills = geometric_mean([o["spills"] for o in outputs])
-        print(
-            f"{target_name} size score: {mean_in_out_ratio} spills score: {mean_spills}",
-            file=output_file,
-        )
-        del vb_warp
 
 
-run_analyze(modules)
-finalized_opcode_cost()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Helper script to automatically run jit code benchmarks for wasm-compiler for CI"
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        help="Path to the wasm-compiler-benchmark folder",
+        required=True,
+    )
+    parser.add_argument("-o", "--output", help="Path to the report")
+    parser.add_argument(
+        "--detail", help="Path to the detail report, will output in markdown format"
+    )
+    parser.add_argument(
+        "--cost-model-prefix",
+        help="Path to the cost model report, will output in plain text",
+    )
+
+    args = parser.parse_args()
+
+    output_file = open(args.output, "w") if args.output else sys.stdout
+    detail_file = open(args.detail, "w") if args.detail else sys.stdout
+
+    cost_model_file: Dict[str, TextIOWrapper] | None = (
+        dict(
+            [
+                [target_name, open(f"{args.cost_model_prefix}_{target_name}.txt", "w")]
+                for target_name in vb_targets
+            ]  # type: ignore
+        )  # type: ignore
+        if args.cost_model_prefix
+        else None
+    )
+
+    usecaseFolder = os.path.join(args.input, "usecases")
+    modules = []
+    for path in os.listdir(usecaseFolder):
+        usecase_folder_path = os.path.join(usecaseFolder, path)
+        if not os.path.isdir(usecase_folder_path):
+            continue
+        for path in os.listdir(usecase_folder_path):
+            if path.endswith("wasm"):
+                modules.append(os.path.join(usecase_folder_path, path))
+
+    run_analyze(modules)
+    finalized_opcode_cost()
@@ -23,7 +23,8 @@ import sys
 import binascii
 
 
-def run_fuzz(fuzz_path, timeout, is_failed):
+def run_fuzz(fuzz_path, timeout, is_failed, dump_wasm):
+    temp_dir = None
     try:
         temp_dir = tempfile.mkdtemp(dir="/dev/shm")
         with subprocess.Popen([fuzz_path, temp_dir]) as process:
@@ -41,10 +42,17 @@ def run_fuzz(fuzz_path, timeout, is_failed):
                     seed = f.read()
                     print(seed + "\n")
 
-                with open(os.path.join(temp_dir, "fuzz.wasm"), "rb") as f:
-                    wasm = f.read()
-                    print("Wasm module:")
-                    print(binascii.hexlify(wasm, b" ") + "\n")
+                if dump_wasm:
+                    print("Wasm module:", flush=True)
+                    # stream the hex dump in chunks to keep memory constant
+                    with open(os.path.join(temp_dir, "fuzz.wasm"), "rb") as f:
+                        separator = b""
+                        while chunk := f.read(65536):
+                            sys.stdout.buffer.write(separator)
+                            sys.stdout.buffer.write(binascii.b2a_hex(chunk, b" "))
+                            separator = b" "
+                    sys.stdout.buffer.write(b"\n\n")
+                    sys.stdout.buffer.flush()
                 is_failed[fuzz_path] = True
 
             failed_seeds_path = os.path.join(temp_dir, "failedseeds.txt")
@@ -57,12 +65,26 @@ def run_fuzz(fuzz_path, timeout, is_failed):
     except Exception as e:
         print(e)
         is_failed[fuzz_path] = True
+    finally:
+        # keep the artifacts of failed runs for reproducing, drop the rest so
+        # /dev/shm does not fill up across runs
+        if temp_dir is not None:
+            if is_failed[fuzz_path]:
+                print(f"Fuzz artifacts of {fuzz_path} kept in {temp_dir}")
+            else:
+                shutil.rmtree(temp_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run fuzz timeout.")
     parser.add_argument("--fuzz_path", help="fuzz binary path", nargs="+")
     parser.add_argument("--timeout", help="timeout", type=int, default=10)
+    parser.add_argument(
+        "--dump-wasm",
+        action="store_true",
+        default=False,
+        help="Print the failed wasm module as hex",
+    )
 
     is_failed = {}
 
@@ -72,7 +94,7 @@ if __name__ == "__main__":
         is_failed[fuzz_path] = False
         thread = threading.Thread(
             target=run_fuzz,
-            args=(fuzz_path, args.timeout, is_failed),
+            args=(fuzz_path, args.timeout, is_failed, args.dump_wasm),
         )
         thread.start()
         threads.append(thread)
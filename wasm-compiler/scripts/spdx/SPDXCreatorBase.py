@@ -16,11 +16,11 @@ import os
 import codecs
 from datetime import datetime
 from urllib.parse import urljoin
-import git
 import uuid
 import hashlib
-import glob
+import mmap
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from spdx_tools.spdx.writer.tagvalue.tagvalue_writer import write_document_to_stream
 from spdx_tools.spdx.model import (
@@ -46,6 +46,7 @@ class SPDXCreatorBase:
         self.__output_path = output_dir
         self.project_root = project_root
         self._licensing = None  # Cache licensing object
+        self._repo = None  # Cache git repository object
 
     def _read_codeowners(self) -> list:
         """Read CODEOWNERS file and extract email addresses"""
@@ -96,42 +97,63 @@ class SPDXCreatorBase:
 
         self.__spdx_doc = Document(creation_info=creation_info)
 
-    def add_source_by_path(self, file_path: str, copy_right: str, license: str) -> str:
+    @staticmethod
+    def _sha1_of_file(file_path: str) -> str:
+        h = hashlib.sha1()
         with open(file_path, "rb") as f:
-            h = hashlib.sha1()
-            while True:
-                data = f.read(h.block_size)
-                if not data:
-                    break
-                h.update(data)
-            sha_str = h.hexdigest()
-
-            file_relative_path = os.path.relpath(file_path, self.project_root)
-
-            from license_expression import get_spdx_licensing
-
-            licensing = get_spdx_licensing()
-            license_expr = licensing.parse(license)
-
-            spdx_id = f"SPDXRef-FILE-{len(self.__spdx_doc.files)}"
-            source_file = File(
-                name=file_relative_path,
-                spdx_id=spdx_id,
-                checksums=[Checksum(ChecksumAlgorithm.SHA1, sha_str)],
-                file_types=[FileType.SOURCE],
-                license_concluded=license_expr,
-                license_info_in_file=[license_expr],
-                copyright_text=copy_right,
-            )
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    h.update(data)
+        return h.hexdigest()
+
+    def add_source_by_path(self, file_path: str, copy_right: str, license: str) -> str:
+        return self._add_source(
+            file_path, self._sha1_of_file(file_path), copy_right, license
+        )
 
-            self.__spdx_doc.files.append(source_file)
-            return spdx_id
+    def _add_source(
+        self, file_path: str, sha_str: str, copy_right: str, license: str
+    ) -> str:
+        file_relative_path = os.path.relpath(file_path, self.project_root)
+
+        from license_expression import get_spdx_licensing
+
+        licensing = get_spdx_licensing()
+        license_expr = licensing.parse(license)
+
+        spdx_id = f"SPDXRef-FILE-{len(self.__spdx_doc.files)}"
+        source_file = File(
+            name=file_relative_path,
+            spdx_id=spdx_id,
+            checksums=[Checksum(ChecksumAlgorithm.SHA1, sha_str)],
+            file_types=[FileType.SOURCE],
+            license_concluded=license_expr,
+            license_info_in_file=[license_expr],
+            copyright_text=copy_right,
+        )
+
+        self.__spdx_doc.files.append(source_file)
+        return spdx_id
+
+    @staticmethod
+    def _collect_files(root_dir: str) -> list:
+        """Collect non-hidden files with an extension, like glob("**/*.*")"""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for filename in sorted(filenames):
+                if not filename.startswith(".") and "." in filename:
+                    files.append(os.path.join(dirpath, filename))
+        return files
 
     def add_file_recursive(self, root_dir: str, copy_right: str, license: str) -> list:
-        files = glob.glob(root_dir + "/**/*.*", recursive=True)
+        files = self._collect_files(root_dir)
+        # hashlib releases the GIL, so the files can be hashed concurrently
+        with ThreadPoolExecutor() as executor:
+            sha_strs = list(executor.map(self._sha1_of_file, files))
         file_ids = []
-        for file_path in files:
-            file_id = self.add_source_by_path(file_path, copy_right, license)
+        for file_path, sha_str in zip(files, sha_strs):
+            file_id = self._add_source(file_path, sha_str, copy_right, license)
             file_ids.append(file_id)
         return file_ids
 
@@ -143,8 +165,15 @@ class SPDXCreatorBase:
         )
         self.__spdx_doc.relationships.append(relationship)
 
+    def get_repo(self) -> "git.Repo":
+        if self._repo is None:
+            import git
+
+            self._repo = git.Repo(self.project_root)
+        return self._repo
+
     def get_git_hash_of_submodule(self, submodule_name: str) -> str:
-        repo = git.Repo(self.project_root)
+        repo = self.get_repo()
         for submodule in repo.submodules:
             if submodule.name == submodule_name:
                 return submodule.hexsha
@@ -160,8 +189,10 @@ class SPDXCreatorBase:
                 checksums.append(file.checksums[0].value)
 
         checksums.sort()
-        verification_string = "".join(checksums)
-        verification_hash = hashlib.sha1(verification_string.encode()).hexdigest()
+        h = hashlib.sha1()
+        for checksum in checksums:
+            h.update(checksum.encode())
+        verification_hash = h.hexdigest()
         return PackageVerificationCode(value=verification_hash, excluded_files=[])
 
     def link_files_to_package(self, package_spdx_id: str, file_spdx_ids: list):
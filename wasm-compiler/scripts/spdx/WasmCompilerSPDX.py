@@ -24,7 +24,6 @@ from spdx_tools.spdx.model import (
     RelationshipType,
 )
 from license_expression import get_spdx_licensing
-import git
 
 
 class WasmCompilerSPDX(SPDXCreatorBase):
@@ -38,16 +37,18 @@ class WasmCompilerSPDX(SPDXCreatorBase):
         package_name = "wasm-compiler"
         self.add_documentation_info(package_name)
 
-        # Get version from git
+        # Get version and current commit hash from git
         try:
-            repo = git.Repo(self.project_root)
+            repo = self.get_repo()
+            commit_sha = repo.head.commit.hexsha
             # Try to get version from latest tag, fallback to commit hash
             try:
                 version = repo.git.describe("--tags", "--abbrev=0")
             except:
-                version = repo.head.commit.hexsha[:8]
+                version = commit_sha[:8]
         except:
             version = "unknown"
+            commit_sha = "unknown"
 
         copyright_text = (
             "Copyright (C) 2025 Bayerische Motoren Werke Aktiengesellschaft (BMW AG)"
@@ -60,13 +61,6 @@ class WasmCompilerSPDX(SPDXCreatorBase):
         # Main repository information
         git_url = "https://github.com/wasm-ecosystem/wasm-compiler.git"  # Update with actual repo URL
 
-        # Get current commit hash
-        try:
-            repo = git.Repo(self.project_root)
-            commit_sha = repo.head.commit.hexsha
-        except:
-            commit_sha = "unknown"
-
         package = Package(
             name=package_name,
             spdx_id="SPDXRef-PACKAGE",
@@ -217,16 +211,14 @@ class WasmCompilerSPDX(SPDXCreatorBase):
         """Finalize packages by adding verification codes and linking files"""
         print("Finalizing packages with verification codes and file relationships...")
 
-        # Get all files from document
-        all_files = self._SPDXCreatorBase__spdx_doc.files
+        # Index all files from document by their SPDX id
+        id_to_file = {f.spdx_id: f for f in self._SPDXCreatorBase__spdx_doc.files}
 
         # Update main package (wasm-compiler)
         for package in self._SPDXCreatorBase__spdx_doc.packages:
             if package.spdx_id == "SPDXRef-PACKAGE":
                 # Get files for main package
-                main_files = [
-                    f for f in all_files if f.spdx_id in self.main_package_file_ids
-                ]
+                main_files = [id_to_file[i] for i in self.main_package_file_ids]
                 if main_files:
                     package.verification_code = (
                         self.calculate_package_verification_code(main_files)
@@ -240,9 +232,7 @@ class WasmCompilerSPDX(SPDXCreatorBase):
 
             elif package.spdx_id == "SPDXRef-PACKAGE-BerkeleySoftFloat":
                 # Get files for Berkeley SoftFloat package
-                berkeley_files = [
-                    f for f in all_files if f.spdx_id in self.berkeley_package_file_ids
-                ]
+                berkeley_files = [id_to_file[i] for i in self.berkeley_package_file_ids]
                 if berkeley_files:
                     package.verification_code = (
                         self.calculate_package_verification_code(berkeley_files)
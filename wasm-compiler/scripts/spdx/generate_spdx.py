@@ -12,12 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from BerkeleySoftFloatSPDX import BerkeleySoftFloatSPDX
-from WasmCompilerSPDX import WasmCompilerSPDX
 import os
 import argparse
-from spdx_tools.spdx.validation.document_validator import validate_full_spdx_document
-from spdx_tools.spdx.parser.parse_anything import parse_file
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -27,14 +23,25 @@ if __name__ == "__main__":
         "-o", "--output_dir", type=str, help="output spdx file dir", default=os.getcwd()
     )
 
+    parser.add_argument(
+        "--skip-validate",
+        action="store_true",
+        help="do not validate the generated spdx file",
+    )
+
     args = parser.parse_args()
 
+    from WasmCompilerSPDX import WasmCompilerSPDX
+
     print("Generating consolidated SPDX for wasm-compiler and dependencies...")
     wasm_compiler_spdx_creator = WasmCompilerSPDX(args.output_dir)
     wasm_compiler_spdx_creator.create_spdx_file()
 
     print("SPDX generation completed!")
 
+    if args.skip_validate:
+        exit(0)
+
     # Validate the generated file
     print("\n" + "=" * 60)
     print("Validating generated SPDX file...")
@@ -42,6 +49,11 @@ if __name__ == "__main__":
     spdx_file = os.path.join(args.output_dir, "wasm-compiler.spdx")
 
     try:
+        from spdx_tools.spdx.validation.document_validator import (
+            validate_full_spdx_document,
+        )
+        from spdx_tools.spdx.parser.parse_anything import parse_file
+
         document = parse_file(spdx_file)
         validation_messages = validate_full_spdx_document(document)
 
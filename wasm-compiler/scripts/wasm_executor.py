@@ -16,6 +16,13 @@ import argparse
 import vb_warp
 from helper import wasm_utils
 
+CONVERTERS = {
+    "i": lambda value: vb_warp.i32(int(value)),
+    "I": lambda value: vb_warp.i64(int(value)),
+    "f": lambda value: vb_warp.f32(float(value)),
+    "F": lambda value: vb_warp.f64(float(value)),
+}
+
 parser = argparse.ArgumentParser(description="run wasm module")
 parser.add_argument("--module", help="path to the wasm file", required=True)
 parser.add_argument("--target", help="target function to execute", required=True)
@@ -34,26 +41,14 @@ runtime.start()
 
 target: str = str(args.target)
 signature: str = str(args.signature)
-arguments = []
-
-for c in signature:
-    if c == "(":
-        continue
-    if c == ")":
-        if not len(args.args) == 0:
-            raise Exception("Too many arguments")
-        break
-    if len(args.args) == 0:
-        raise Exception("Too less arguments")
-    match c:
-        case "i":
-            arguments.append(vb_warp.i32(int(args.args.pop(0))))
-        case "I":
-            arguments.append(vb_warp.i64(int(args.args.pop(0))))
-        case "f":
-            arguments.append(vb_warp.f32(float(args.args.pop(0))))
-        case "F":
-            arguments.append(vb_warp.f64(float(args.args.pop(0))))
+
+params, closed, _ = signature.replace("(", "").partition(")")
+param_types = [c for c in params if c in CONVERTERS]
+if len(args.args) < len(param_types):
+    raise Exception("Too less arguments")
+if closed and len(args.args) > len(param_types):
+    raise Exception("Too many arguments")
+arguments = [CONVERTERS[c](value) for c, value in zip(param_types, args.args)]
 
 
 res = runtime.call(target, signature, arguments)
@@ -20,6 +20,14 @@ from os.path import join
 import argparse
 import json
 import base64
+import hashlib
+import io
+import mmap
+import struct
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable
 
 root_path = os.path.abspath(join(os.path.dirname(__file__), ".."))
 testcase_path = join(root_path, "tests", "testcases")
@@ -27,9 +35,26 @@ testcase_binary_folder = join(root_path, "tests", "testcases", "bin")
 testcase_filepath = join(root_path, "tests", "testcases.json")
 testsuite_path = None
 
-BLACK_LIST = ["spectest_linking"]
+BLACK_LIST = frozenset({"spectest_linking"})
 
-wast2json_command = "wast2json -o %s %s"
+HEX_TABLE = [hex(i) for i in range(256)]
+
+# command type encoding, detail see cpp
+TYPE_TO_TAG = {
+    "module": 0,
+    "assert_return": 1,
+    "action": 2,
+    "assert_trap": 3,
+    "assert_exhaustion": 4,
+    "assert_invalid": 5,
+    "assert_malformed": 9,
+}
+ACTION_TYPE_TO_TAG = {"get": 0, "invoke": 1}
+MODULE_TYPES = frozenset({"module", "assert_invalid", "assert_malformed"})
+ACTION_TYPES = frozenset(
+    {"assert_return", "action", "assert_trap", "assert_exhaustion"}
+)
+SKIPPED_TYPES = frozenset({"assert_uninstantiable", "assert_unlinkable", "register"})
 
 
 def collect_proposals_testcases(root: str) -> list:
@@ -38,19 +63,17 @@ def collect_proposals_testcases(root: str) -> list:
 
 def collect_testcases(root: str) -> list:
     files = []
-    for path in os.listdir(root):
-        fullpath = join(root, path)
-        if os.path.isdir(fullpath):
-            if path == "proposals":
-                files += collect_proposals_testcases(fullpath)
-                continue
-            files += collect_testcases(fullpath)
-            continue
-        if fullpath.endswith(".wast"):
-            if "simd" in path:
-                # tricore qemu do not have enough pflash, ignore all simd related case until we implement it.
-                continue
-            files.append(fullpath)
+    for dirpath, dirnames, filenames in os.walk(root):
+        if "proposals" in dirnames:
+            dirnames.remove("proposals")
+            files += collect_proposals_testcases(join(dirpath, "proposals"))
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".wast"):
+                if "simd" in filename:
+                    # tricore qemu do not have enough pflash, ignore all simd related case until we implement it.
+                    continue
+                files.append(join(dirpath, filename))
     return files
 
 
@@ -58,260 +81,322 @@ def get_testsuite_name(path):
     return os.path.relpath(path, testsuite_path).replace(os.path.sep, "_")[:-5]
 
 
-def generate_json(testsuite_wast_filepaths, force: bool):
-    testcases = {}
-    for testsuite_wast_file in testsuite_wast_filepaths:
-        testsuite_name = get_testsuite_name(testsuite_wast_file)
-        if testsuite_name in BLACK_LIST:
+def is_up_to_date(output_file: str, input_files: list[str]) -> bool:
+    try:
+        output_mtime = os.path.getmtime(output_file)
+    except OSError:
+        return False
+    return all(os.path.getmtime(path) <= output_mtime for path in input_files)
+
+
+def wait_wast2json(process: subprocess.Popen):
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+
+def generate_wast_json(
+    testsuite_wast_filepaths: list[str], testsuite_json_files: list[str], force: bool
+):
+    processes: list[subprocess.Popen] = []
+    for testsuite_wast_file, testsuite_json_file in zip(
+        testsuite_wast_filepaths, testsuite_json_files
+    ):
+        if not force and is_up_to_date(testsuite_json_file, [testsuite_wast_file]):
             continue
-        testsuite_json_file = join(testcase_path, testsuite_name + ".json")
-        if not (os.path.exists(testsuite_json_file) and not force):
-            os.system(wast2json_command % (testsuite_json_file, testsuite_wast_file))
-        with open(testsuite_json_file, "r", encoding="UTF-8") as f:
-            testsuite_json = json.load(f)
-            short_filename = testsuite_name
-            testcases[short_filename] = {
-                "wast_json": testsuite_json,
-            }
-            for command in testsuite_json["commands"]:
-                type = command["type"]
-                if (
-                    type == "module"
-                    or type == "assert_invalid"
-                    or type == "assert_malformed"
-                ):
-                    filename = command["filename"]
-                    if filename[-4:] != "wasm":
-                        continue
-                    with open(
-                        join(os.path.dirname(testsuite_json_file), filename), "rb"
-                    ) as wasmfile:
-                        wasm_binary = wasmfile.read()
-                        wasm_b64 = str(base64.b64encode(wasm_binary), encoding="ascii")
-                        testcases[short_filename][filename] = wasm_b64
+        if len(processes) >= os.cpu_count():
+            wait_wast2json(processes.pop(0))
+        processes.append(
+            subprocess.Popen(
+                ["wast2json", "-o", testsuite_json_file, testsuite_wast_file],
+                stdout=subprocess.DEVNULL,
+            )
+        )
+    for process in processes:
+        wait_wast2json(process)
+
+
+def read_wasm_file(path: str) -> bytes | mmap.mmap:
+    with open(path, "rb") as wasmfile:
+        if os.fstat(wasmfile.fileno()).st_size == 0:
+            return b""  # empty files cannot be mapped
+        return mmap.mmap(wasmfile.fileno(), 0, access=mmap.ACCESS_READ)
+
 
-    f = open(testcase_filepath, "w")
-    json.dump(testcases, f)
-    f.close()
+def close_wasm_files(wasm_binaries: dict[str, bytes | mmap.mmap]):
+    for wasm_binary in wasm_binaries.values():
+        if isinstance(wasm_binary, mmap.mmap):
+            wasm_binary.close()
+
+
+def read_testsuite(testsuite_json_file: str):
+    with open(testsuite_json_file, "r", encoding="UTF-8") as f:
+        testsuite_json = json.load(f)
+    wasm_binaries: dict[str, bytes | mmap.mmap] = {}
+    for command in testsuite_json["commands"]:
+        if command["type"] in MODULE_TYPES:
+            filename = command["filename"]
+            if filename[-4:] != "wasm" or filename in wasm_binaries:
+                continue
+            wasm_binaries[filename] = read_wasm_file(
+                join(os.path.dirname(testsuite_json_file), filename)
+            )
+    return testsuite_json, wasm_binaries
+
+
+def dump_json(value) -> bytes:
+    try:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+    except UnicodeEncodeError:
+        # lone surrogates cannot be encoded as UTF-8, keep them escaped
+        return json.dumps(value, separators=(",", ":")).encode()
+
+
+def generate_one_json(
+    testsuite_json: dict, wasm_binaries: dict[str, bytes | mmap.mmap]
+) -> bytes:
+    testcase = {
+        "wast_json": testsuite_json,
+    }
+    for filename, wasm_binary in wasm_binaries.items():
+        testcase[filename] = base64.b64encode(wasm_binary).decode("ascii")
+    # serialized in the worker, so only bytes cross back to the parent process
+    return dump_json(testcase)
+
+
+def get_testcases_stamp(testsuite_names: list[str], testsuite_json_files: list[str]):
+    stamp = hashlib.sha256()
+    stamp.update(str(os.path.getmtime(__file__)).encode())
+    for testsuite_name, testsuite_json_file in zip(
+        testsuite_names, testsuite_json_files
+    ):
+        stamp.update(
+            f"{testsuite_name}:{os.path.getmtime(testsuite_json_file)}\n".encode()
+        )
+    return stamp.hexdigest()
+
+
+def is_testcases_up_to_date(stamp: str) -> bool:
+    if not os.path.exists(testcase_filepath):
+        return False
+    try:
+        with open(testcase_filepath + ".stamp", "r", encoding="ascii") as f:
+            return f.read() == stamp
+    except OSError:
+        return False
+
+
+def generate_json(testcases: Iterable[tuple[str, bytes]], stamp: str):
+    # same layout as dump_json of {testsuite_name: testcase}
+    with open(testcase_filepath, "wb") as f:
+        f.write(b"{")
+        for i, (testsuite_name, testcase) in enumerate(testcases):
+            if i != 0:
+                f.write(b",")
+            f.write(dump_json(testsuite_name))
+            f.write(b":")
+            f.write(testcase)
+        f.write(b"}")
+    with open(testcase_filepath + ".stamp", "w", encoding="ascii") as f:
+        f.write(stamp)
 
 
 def reorder_commands(commands):
-    orderedCommandsName = ["none"]
     orderedCommands = [[]]
-    ignores = []
+    # actions on a reused module name go to the first module with that name
+    name_to_bucket = {"none": orderedCommands[0]}
+    ignores = set()
     for command in commands:
         type = command["type"]
         if type == "module":
-            if "name" in command:
-                orderedCommandsName.append(command["name"])
-            else:
-                orderedCommandsName.append("!___def")
             orderedCommands.append([command])
+            name_to_bucket.setdefault(
+                command.get("name", "!___def"), orderedCommands[-1]
+            )
         elif "action" in command and "module" in command["action"]:
             name = command["action"]["module"]
             if name in ignores:
                 continue
-            orderedCommands[orderedCommandsName.index(name)].append(command)
+            name_to_bucket[name].append(command)
         elif "type" in command and "name" in command and command["type"] == "register":
-            ignores.append(command["name"])
+            ignores.add(command["name"])
         else:
             orderedCommands[-1].append(command)
     return [i for item in orderedCommands for i in item]
 
 
-def writeU8(buf: list, pos: int, value: int):
-    while pos >= len(buf):
-        buf.append(0)
-    assert buf[pos] == 0
-    assert value <= 255
-    buf[pos] = value
-    return pos + 1
+def writeU8(buf: io.BytesIO, value: int):
+    buf.write(struct.pack("B", value))
 
 
-def writeU16(buf: list, pos: int, value: int):
-    writeU8(buf, pos, value >> 8)
-    writeU8(buf, pos + 1, value & 0xFF)
-    return pos + 2
+def writeU16(buf: io.BytesIO, value: int):
+    buf.write(struct.pack(">H", value))
 
 
-def writeU32(buf: list, pos: int, value: int):
-    writeU16(buf, pos, value >> 16)
-    writeU16(buf, pos + 2, value & 0xFFFF)
-    return pos + 4
+def writeU32(buf: io.BytesIO, value: int):
+    buf.write(struct.pack(">I", value))
 
 
-def writeSpan(buf: list, pos: int, value: list[int]):
-    pos = writeU32(buf, pos, len(value))
-    for v in value:
-        pos = writeU8(buf, pos, v)
-    return pos
+def patchU32(buf: io.BytesIO, pos: int, value: int):
+    with buf.getbuffer() as view:
+        view[pos : pos + 4] = struct.pack(">I", value)
 
 
-def writeString(buf: list, pos: int, value: str):
-    encodedValue = str.encode(value, encoding="utf-8")
-    pos = writeU32(buf, pos, len(encodedValue))
-    for char in encodedValue:
-        pos = writeU8(buf, pos, char)
-    return pos
+def writeSpan(buf: io.BytesIO, value: bytes | mmap.mmap):
+    writeU32(buf, len(value))
+    buf.write(value)
 
 
-def generate_binary(testsuite_wast_filepaths: list[str], force: bool) -> list[str]:
-    testsuite_binary_filepaths: list[str] = []
-    for testsuite_wast_file in testsuite_wast_filepaths:
-        testsuite_name = get_testsuite_name(testsuite_wast_file)
-        if testsuite_name in BLACK_LIST:
+def writeString(buf: io.BytesIO, value: str):
+    encodedValue = str.encode(value, encoding="utf-8")
+    writeU32(buf, len(encodedValue))
+    buf.write(encodedValue)
+
+
+def generate_one_binary(
+    testsuite_name: str,
+    testsuite_json: dict,
+    wasm_binaries: dict[str, bytes | mmap.mmap],
+    binary_file_path: str,
+):
+    commands = reorder_commands(commands=testsuite_json["commands"])
+    buffer = io.BytesIO()
+    writeString(buffer, testsuite_name)
+    has_module = True
+    for command in commands:
+        # guard
+        type = command["type"]
+        if type in SKIPPED_TYPES:
             continue
-        testsuite_json_file = join(testcase_path, testsuite_name + ".json")
-        if not (os.path.exists(testsuite_json_file) and not force):
-            os.system(wast2json_command % (testsuite_json_file, testsuite_wast_file))
-        with open(testsuite_json_file, "r", encoding="UTF-8") as f:
-            binary_file_path = join(testcase_binary_folder, testsuite_name + ".bin")
-            binary_file = open(binary_file_path, "wb")
-            testsuite_binary_filepaths.append(binary_file_path)
-
-            testsuite_json = json.load(f)
-            commands = reorder_commands(commands=testsuite_json["commands"])
-            buffer = []
-            pos = 0
-            pos = writeString(buffer, pos, testsuite_name)
+        if type in MODULE_TYPES:
+            filename = command["filename"]
+            if filename[-4:] != "wasm":
+                has_module = False
+                continue
             has_module = True
-            for command in commands:
-                # guard
-                type = command["type"]
-                if (
-                    type == "assert_uninstantiable"
-                    or type == "assert_unlinkable"
-                    or type == "register"
-                ):
-                    continue
-                if (
-                    type == "module"
-                    or type == "assert_invalid"
-                    or type == "assert_malformed"
-                ):
-                    filename = command["filename"]
-                    if filename[-4:] != "wasm":
-                        has_module = False
+        if not has_module:
+            continue
+        # encode, detail see cpp
+        lengthPos = buffer.tell()
+        writeU32(buffer, 0)  # commandLength
+        tag = TYPE_TO_TAG.get(type)
+        if tag is not None:
+            writeU8(buffer, tag)  # type
+        writeU32(buffer, command["line"])  # line
+
+        if type in MODULE_TYPES:
+            filename = command["filename"]
+            assert filename[-4:] == "wasm"
+            writeSpan(buffer, wasm_binaries[filename])  # bytecode
+
+        elif type in ACTION_TYPES:
+            actionLengthPos = buffer.tell()
+            writeU32(buffer, 0)  # actionLength
+            action_tag = ACTION_TYPE_TO_TAG.get(command["action"]["type"])
+            if action_tag is not None:
+                writeU8(buffer, action_tag)
+            writeString(buffer, command["action"]["field"])
+
+            if "args" in command["action"]:
+                args = command["action"]["args"]
+            else:
+                args = []
+            writeU32(buffer, len(args))
+            for arg in args:
+                writeString(buffer, arg["type"])
+                if "value" in arg:
+                    if isinstance(arg["value"], list):  # SIMD
                         continue
-                    has_module = True
-                if not has_module:
-                    continue
-                # encode, detail see cpp
-                lengthPos = pos
-                pos = writeU32(buffer, pos, 0)  # commandLength
-                if command["type"] == "module":
-                    pos = writeU8(buffer, pos, 0)  # type
-                elif command["type"] == "assert_return":
-                    pos = writeU8(buffer, pos, 1)  # type
-                elif command["type"] == "action":
-                    pos = writeU8(buffer, pos, 2)  # type
-                elif command["type"] == "assert_trap":
-                    pos = writeU8(buffer, pos, 3)  # type
-                elif command["type"] == "assert_exhaustion":
-                    pos = writeU8(buffer, pos, 4)  # type
-                elif command["type"] == "assert_invalid":
-                    pos = writeU8(buffer, pos, 5)  # type
-                elif command["type"] == "assert_malformed":
-                    pos = writeU8(buffer, pos, 9)  # type
-                pos = writeU32(buffer, pos, command["line"])  # line
-
-                if (
-                    type == "module"
-                    or type == "assert_invalid"
-                    or type == "assert_malformed"
-                ):
-                    filename = command["filename"]
-                    assert filename[-4:] == "wasm"
-                    wasmfile = open(
-                        join(os.path.dirname(testsuite_json_file), filename), "rb"
-                    )
-                    wasm_binary = wasmfile.read()
-
-                    pos = writeSpan(buffer, pos, list(wasm_binary))  # bytecode
-
-                elif (
-                    type == "assert_return"
-                    or type == "action"
-                    or type == "assert_trap"
-                    or type == "assert_exhaustion"
-                ):
-                    actionLengthPos = pos
-                    pos = writeU32(buffer, pos, 0)  # actionLength
-                    if command["action"]["type"] == "get":
-                        pos = writeU8(buffer, pos, 0)
-                    elif command["action"]["type"] == "invoke":
-                        pos = writeU8(buffer, pos, 1)
-                    pos = writeString(buffer, pos, command["action"]["field"])
-
-                    if "args" in command["action"]:
-                        args = command["action"]["args"]
-                    else:
-                        args = []
-                    pos = writeU32(buffer, pos, len(args))
-                    for arg in args:
-                        pos = writeString(buffer, pos, arg["type"])
-                        if "value" in arg:
-                            if isinstance(arg["value"], list):  # SIMD
-                                continue
-                            pos = writeString(buffer, pos, arg["value"])
-                        else:
-                            pos = writeString(buffer, pos, "0")
-
-                    actionLength = pos - actionLengthPos - 4
-                    writeU32(buffer, actionLengthPos, actionLength)
-
-                    pos = writeU32(buffer, pos, len(command["expected"]))
-                    for arg in command["expected"]:
-                        pos = writeString(buffer, pos, arg["type"])
-                        if "value" in arg:
-                            if isinstance(arg["value"], list):  # SIMD
-                                continue
-                            pos = writeString(buffer, pos, arg["value"])
-                        else:
-                            pos = writeString(buffer, pos, "0")
-
-                    if "text" in command:
-                        pos = writeString(buffer, pos, command["text"])
-                    else:
-                        pos = writeString(buffer, pos, "")
-
-                length = pos - lengthPos - 4
-                assert length != 0
-                writeU32(buffer, lengthPos, length)  # fill commandLength
-
-            writeU32(buffer, pos, 0)  # stop
-
-            binary_file.write(bytes(buffer))
-            binary_file.close()
-    return testsuite_binary_filepaths
+                    writeString(buffer, arg["value"])
+                else:
+                    writeString(buffer, "0")
+
+            actionLength = buffer.tell() - actionLengthPos - 4
+            patchU32(buffer, actionLengthPos, actionLength)
+
+            writeU32(buffer, len(command["expected"]))
+            for arg in command["expected"]:
+                writeString(buffer, arg["type"])
+                if "value" in arg:
+                    if isinstance(arg["value"], list):  # SIMD
+                        continue
+                    writeString(buffer, arg["value"])
+                else:
+                    writeString(buffer, "0")
+
+            if "text" in command:
+                writeString(buffer, command["text"])
+            else:
+                writeString(buffer, "")
+
+        length = buffer.tell() - lengthPos - 4
+        assert length != 0
+        patchU32(buffer, lengthPos, length)  # fill commandLength
+
+    writeU32(buffer, 0)  # stop
+
+    with open(binary_file_path, "wb") as binary_file:
+        binary_file.write(buffer.getvalue())
+
+
+def generate_one_testsuite(
+    testsuite_name: str,
+    testsuite_json_file: str,
+    binary_file_path: str,
+    with_json: bool,
+    with_binary: bool,
+):
+    if not with_json and not with_binary:
+        return None
+    testsuite_json, wasm_binaries = read_testsuite(testsuite_json_file)
+    try:
+        if with_binary:
+            generate_one_binary(
+                testsuite_name, testsuite_json, wasm_binaries, binary_file_path
+            )
+        if with_json:
+            return generate_one_json(testsuite_json, wasm_binaries)
+        return None
+    finally:
+        close_wasm_files(wasm_binaries)
 
 
 def assembly_binary(binary_filepaths: list[str]):
-    payloads = [[]]
+    chunks: list[list[bytes]] = [[]]
+    chunk_size = 0
     for binary_filePath in binary_filepaths:
         with open(binary_filePath, "rb") as f:
-            payload = f.read()
-            payloads[-1] += list(payload)
-            if len(payloads[-1]) > 1.5 * 1024 * 1024:  # keep one file less than 1.5MB
-                payloads.append([])
+            chunks[-1].append(f.read())
+            chunk_size += len(chunks[-1][-1])
+            if chunk_size > 1.5 * 1024 * 1024:  # keep one file less than 1.5MB
+                chunks.append([])
+                chunk_size = 0
+    payloads = [b"".join(chunk) for chunk in chunks]
 
     for i in range(len(payloads)):
-        payload = payloads[i]
-        total_c = open(join(testcase_binary_folder, f"total_{i}.cpp"), "w")
-        total_c.write(
-            """
+        payload = memoryview(payloads[i])
+        with open(join(testcase_binary_folder, f"total_{i}.cpp"), "w") as total_c:
+            total_c.write(
+                """
     // clang-format off
     #include <array>
     #include <cstdint>
     #include <cstdlib>
 
-    std::array<uint8_t, {0}U> constexpr const testcases = {{{1}}};
+    std::array<uint8_t, {0}U> constexpr const testcases = {{""".format(
+                    len(payload)
+                )
+            )
+            for offset in range(0, len(payload), 65536):
+                if offset != 0:
+                    total_c.write(",")
+                chunk = payload[offset : offset + 65536]
+                total_c.write(",".join(map(HEX_TABLE.__getitem__, chunk)))
+            total_c.write(
+                """};
     void const * pTestcase = testcases.data();
     size_t testcaseSize = testcases.size();
-    \n""".format(
-                len(payload), ",".join([hex(e) for e in payload])
+    \n"""
             )
-        )
         print(f"generate file in total_{i}.cpp")
     assert len(payloads) <= 2  # we only have 2 standalone test case in cmake and bazel
 
@@ -321,9 +406,45 @@ def generate_testcases(force: bool):
         os.mkdir(testcase_path)
     if not os.path.exists(testcase_binary_folder):
         os.mkdir(testcase_binary_folder)
-    testsuite_wast_filepaths = collect_testcases(testsuite_path)
-    generate_json(testsuite_wast_filepaths, force)
-    binary_filepaths = generate_binary(testsuite_wast_filepaths, force)
+    testsuite_wast_filepaths = []
+    testsuite_names = []
+    for path in collect_testcases(testsuite_path):
+        testsuite_name = get_testsuite_name(path)
+        if testsuite_name not in BLACK_LIST:
+            testsuite_wast_filepaths.append(path)
+            testsuite_names.append(testsuite_name)
+    testsuite_json_files = [
+        join(testcase_path, testsuite_name + ".json")
+        for testsuite_name in testsuite_names
+    ]
+    generate_wast_json(testsuite_wast_filepaths, testsuite_json_files, force)
+
+    binary_filepaths = [
+        join(testcase_binary_folder, testsuite_name + ".bin")
+        for testsuite_name in testsuite_names
+    ]
+    stamp = get_testcases_stamp(testsuite_names, testsuite_json_files)
+    with_json = force or not is_testcases_up_to_date(stamp)
+    with_binary = [
+        force or not is_up_to_date(binary_file_path, [testsuite_json_file, __file__])
+        for binary_file_path, testsuite_json_file in zip(
+            binary_filepaths, testsuite_json_files
+        )
+    ]
+    # each testsuite is read once and feeds both testcases.json and its .bin
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        testcases = executor.map(
+            generate_one_testsuite,
+            testsuite_names,
+            testsuite_json_files,
+            binary_filepaths,
+            repeat(with_json),
+            with_binary,
+        )
+        if with_json:
+            generate_json(zip(testsuite_names, testcases), stamp)
+        else:
+            list(testcases)
     assembly_binary(binary_filepaths)
 
 